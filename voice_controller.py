@@ -3,18 +3,36 @@ Voice-Controlled Hardware Demo Application
 Educational prototype for voice command to ESP8266 communication
 """
 
+import json
+import re
+from functools import lru_cache
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import speech_recognition as sr
-import requests
+import http.client
+import queue
+import socket
 import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    from vosk import Model, KaldiRecognizer  # Optional offline recognizer
+except ImportError:
+    Model = KaldiRecognizer = None
+
 # ============================================
 # CONFIGURATION
 # ============================================
 ESP_IP = "192.168.10.193"  # ESP8266 IP address for blood flow LED control
 TIMEOUT = 2  # HTTP request timeout in seconds
+PHRASE_LIMIT = 2.0  # Max seconds of audio captured per voice command
+DEBOUNCE_WINDOW = 0.3  # Repeats of the same command within this many seconds are dropped
+LOG_MAX_LINES = 2000  # Activity log is trimmed once it grows past this many lines
+LOG_TRIM_LINES = 500  # Oldest lines removed per trim
+LOG_FLUSH_MS = 50  # Interval for writing queued log messages to the log box
 
 # Command mapping: voice phrase -> numeric code
 COMMAND_MAP = {
@@ -27,24 +45,184 @@ COMMAND_MAP = {
     "reset": "2",
 }
 
+# Pre-lowered (phrase, code) pairs; the map itself is read-only at runtime,
+# which also keeps the cached parse results valid
+_COMMAND_TUPLE = tuple((phrase.lower(), code) for phrase, code in COMMAND_MAP.items())
+COMMAND_MAP = types.MappingProxyType(COMMAND_MAP)
+
+# Request path for each single-digit command code sent to the ESP
+_PATH_FOR = {str(i): f"/{i}" for i in range(10)}
+
+# Offline recognition: set to a Vosk model directory to decode locally
+# instead of sending audio to Google (requires the vosk package)
+VOSK_MODEL_PATH = None
+VOSK_SAMPLE_RATE = 16000
+
+# Phrases the local recognizer is restricted to ("[unk]" absorbs chatter)
+VOSK_GRAMMAR = [phrase for phrase, _ in _COMMAND_TUPLE] + [
+    "increase blood flow",
+    "decrease blood flow",
+    "more blood",
+    "reduce blood",
+    "[unk]",
+]
+
+# Blood flow phrases, checked before COMMAND_MAP in this order.
+# A rule matches when every term appears somewhere in the speech text.
+BLOOD_FLOW_RULES = (
+    (("increase", "flow"), "1"),   # Increase blood flow → LED ON (1)
+    (("more blood",), "1"),
+    (("decrease", "flow"), "2"),   # Decrease blood flow → LED OFF (2)
+    (("reduce blood",), "2"),
+)
+
+# All parse rules in priority order, compiled once into a single pattern.
+# Each alternative is a set of lookaheads anchored at the start of the text
+# followed by an empty group, so the first rule that matches (not the
+# leftmost phrase) decides the command, exactly like checking them in turn.
+_PARSE_RULES = BLOOD_FLOW_RULES + tuple(((phrase,), code) for phrase, code in _COMMAND_TUPLE)
+_PHRASE_RE = re.compile(
+    "|".join(
+        "".join(f"(?=.*?{re.escape(term)})" for term in terms) + "()"
+        for terms, _ in _PARSE_RULES
+    ),
+    re.DOTALL,
+)
+_PHRASE_CODES = tuple(code for _, code in _PARSE_RULES)
+
+# Letters each rule needs; text lacking every set cannot match any rule
+_RULE_LETTERS = tuple(
+    frozenset("".join(terms).replace(" ", "")) for terms, _ in _PARSE_RULES
+)
+
+
+@lru_cache(maxsize=256)
+def _parse_command(text):
+    """Map normalized (lowercased, stripped) speech text to command code"""
+    # Cheap prefilter so background chatter skips the pattern
+    letters = set(text)
+    if not any(required <= letters for required in _RULE_LETTERS):
+        return None
+    
+    match = _PHRASE_RE.match(text)
+    if match:
+        return _PHRASE_CODES[match.lastindex - 1]
+    return None
+
+
+@lru_cache(maxsize=1)
+def _cached_mic_names():
+    """Enumerate microphone devices once; PortAudio enumeration is slow"""
+    return tuple(sr.Microphone.list_microphone_names())
+
+
+# ============================================
+# UI LAYOUT
+# ============================================
+FONT_REGULAR = ("Segoe UI", 10)
+FONT_BOLD = ("Segoe UI", 10, "bold")
+FONT_SMALL_BOLD = ("Segoe UI", 9, "bold")
+FONT_LARGE_BOLD = ("Segoe UI", 11, "bold")
+
+# Control buttons: attribute name, row, label, colors and handler method
+_BUTTONS = [
+    dict(key="start_btn", row=1, text="▶ Start Listening", font=FONT_LARGE_BOLD,
+         bg="#28a745", active_bg="#218838", cmd="start_listening"),
+    dict(key="stop_btn", row=1, text="⏹ Stop Listening", font=FONT_LARGE_BOLD,
+         bg="#dc3545", active_bg="#c82333", state=tk.DISABLED, cmd="stop_listening"),
+    dict(key="normal_mode_btn", row=2, text="🟢 Normal Mode",
+         bg="#17a2b8", active_bg="#138496", cmd="set_normal_mode"),
+    dict(key="critical_mode_btn", row=2, text="🔴 Critical Mode",
+         bg="#ffc107", fg="#212529", active_bg="#e0a800", cmd="set_critical_mode"),
+    dict(key="reset_btn", row=2, text="🔄 Reset",
+         bg="#6c757d", active_bg="#5a6268", cmd="reset_system"),
+]
+
+_REFRESH_BUTTON = dict(text="🔄 Refresh", font=FONT_SMALL_BOLD, bd=1,
+                       bg="#6c757d", active_bg="#5a6268")
+
+
+def _make_button(parent, spec, command):
+    """Create a tk.Button from a button spec"""
+    fg = spec.get("fg", "white")
+    return tk.Button(
+        parent,
+        text=spec["text"],
+        font=spec.get("font", FONT_BOLD),
+        bg=spec["bg"],
+        fg=fg,
+        activebackground=spec["active_bg"],
+        activeforeground=fg,
+        relief=tk.RAISED,
+        bd=spec.get("bd", 2),
+        cursor="hand2",
+        state=spec.get("state", tk.NORMAL),
+        command=command
+    )
+
 
 # ============================================
 # MAIN APPLICATION CLASS
 # ============================================
 class VoiceControllerApp:
+    # Fixed attribute set: no per-instance __dict__ on the hot callback paths
+    __slots__ = (
+        "root", "is_listening", "is_critical_mode", "recognizer", "microphone",
+        "mic_list", "selected_mic_index",
+        # Widgets
+        "mic_combo", "refresh_mic_btn", "mic_status_label", "esp_status_label",
+        "speech_text_label", "start_btn", "stop_btn", "normal_mode_btn",
+        "critical_mode_btn", "reset_btn", "log_box",
+        # Background work
+        "_stop_bg", "_vosk", "_recognize_pool", "_conn", "_conn_lock",
+        "_http_pool", "_log_q", "_last_cmd",
+    )
+    
+    # Color coding for different log levels
+    _LEVEL_COLORS = {
+        "INFO": "#61afef",
+        "HEARD": "#98c379",
+        "PARSED": "#e5c07b",
+        "SENT": "#c678dd",
+        "OK": "#56b6c2",
+        "WARN": "#e06c75",
+        "ERROR": "#e06c75",
+        "MODE": "#d19a66",
+        "RESET": "#abb2bf"
+    }
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Voice Command Controller")
         self.root.geometry("700x600")
         self.root.resizable(False, False)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # State variables
         self.is_listening = False
         self.is_critical_mode = False
         self.recognizer = sr.Recognizer()
+        # Fixed mic setup: keep the calibrated threshold instead of
+        # recomputing it per audio chunk, and end phrases sooner
+        self.recognizer.dynamic_energy_threshold = False
+        self.recognizer.pause_threshold = 0.5
         self.microphone = None  # Will be set based on selection
         self.mic_list = []
         self.selected_mic_index = None
+        self._stop_bg = None  # Stopper returned by listen_in_background
+        self._vosk = None  # KaldiRecognizer when local recognition is enabled
+        self._last_cmd = (None, 0.0)  # (code, monotonic time) of last command sent
+        self._log_q = queue.SimpleQueue()  # Pending (timestamp, level, message) log entries
+        
+        # Recognition worker: one thread keeps results in speaking order
+        self._recognize_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr")
+        
+        # One reused HTTP/1.1 connection to the ESP (reconnects on demand)
+        self._conn = http.client.HTTPConnection(ESP_IP, timeout=TIMEOUT)
+        self._conn_lock = threading.Lock()
+        
+        # HTTP worker: the ESP serves one request at a time, so queue them
+        self._http_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="esp")
         
         # Configure styles
         self.setup_styles()
@@ -52,6 +230,9 @@ class VoiceControllerApp:
         # Build UI
         self.build_ui()
         
+        # Start writing queued log messages
+        self._drain_log()
+        
         # Initialize microphone list
         self.refresh_mic_list()
         
@@ -67,16 +248,16 @@ class VoiceControllerApp:
         
         # Configure button styles
         style.configure('Action.TButton', 
-                       font=('Segoe UI', 10, 'bold'),
+                       font=FONT_BOLD,
                        padding=10)
         
         style.configure('Critical.TButton',
-                       font=('Segoe UI', 10, 'bold'),
+                       font=FONT_BOLD,
                        padding=10,
                        background='#dc3545')
         
         style.configure('Normal.TButton',
-                       font=('Segoe UI', 10, 'bold'),
+                       font=FONT_BOLD,
                        padding=10,
                        background='#28a745')
         
@@ -104,7 +285,7 @@ class VoiceControllerApp:
         tk.Label(
             mic_select_frame,
             text="Microphone Device:",
-            font=("Segoe UI", 10, "bold"),
+            font=FONT_BOLD,
             bg="#ecf0f1",
             fg="#34495e"
         ).pack(side=tk.LEFT, padx=(0, 10))
@@ -118,19 +299,7 @@ class VoiceControllerApp:
         self.mic_combo.pack(side=tk.LEFT, padx=5)
         self.mic_combo.bind("<<ComboboxSelected>>", self.on_mic_selected)
         
-        self.refresh_mic_btn = tk.Button(
-            mic_select_frame,
-            text="🔄 Refresh",
-            font=("Segoe UI", 9, "bold"),
-            bg="#6c757d",
-            fg="white",
-            activebackground="#5a6268",
-            activeforeground="white",
-            relief=tk.RAISED,
-            bd=1,
-            cursor="hand2",
-            command=self.refresh_mic_list
-        )
+        self.refresh_mic_btn = _make_button(mic_select_frame, _REFRESH_BUTTON, self.on_refresh_mic)
         self.refresh_mic_btn.pack(side=tk.LEFT, padx=5)
         
         # ===== STATUS PANEL =====
@@ -144,7 +313,7 @@ class VoiceControllerApp:
         tk.Label(
             mic_frame,
             text="Microphone:",
-            font=("Segoe UI", 10),
+            font=FONT_REGULAR,
             bg="#ecf0f1",
             fg="#34495e"
         ).pack(side=tk.LEFT)
@@ -152,7 +321,7 @@ class VoiceControllerApp:
         self.mic_status_label = tk.Label(
             mic_frame,
             text="Idle",
-            font=("Segoe UI", 10, "bold"),
+            font=FONT_BOLD,
             bg="#ecf0f1",
             fg="#6c757d",
             width=12
@@ -166,7 +335,7 @@ class VoiceControllerApp:
         tk.Label(
             esp_frame,
             text="ESP8266:",
-            font=("Segoe UI", 10),
+            font=FONT_REGULAR,
             bg="#ecf0f1",
             fg="#34495e"
         ).pack(side=tk.LEFT)
@@ -174,7 +343,7 @@ class VoiceControllerApp:
         self.esp_status_label = tk.Label(
             esp_frame,
             text="Checking...",
-            font=("Segoe UI", 10, "bold"),
+            font=FONT_BOLD,
             bg="#ecf0f1",
             fg="#6c757d",
             width=15
@@ -188,7 +357,7 @@ class VoiceControllerApp:
         tk.Label(
             speech_frame,
             text="Last Detected Speech:",
-            font=("Segoe UI", 10, "bold"),
+            font=FONT_BOLD,
             bg="white",
             fg="#34495e"
         ).pack(anchor=tk.W)
@@ -212,89 +381,16 @@ class VoiceControllerApp:
         button_frame = tk.Frame(self.root, bg="white", padx=20, pady=10)
         button_frame.pack(fill=tk.X)
         
-        # Row 1: Start/Stop Listening
-        row1 = tk.Frame(button_frame, bg="white")
-        row1.pack(fill=tk.X, pady=5)
-        
-        self.start_btn = tk.Button(
-            row1,
-            text="▶ Start Listening",
-            font=("Segoe UI", 11, "bold"),
-            bg="#28a745",
-            fg="white",
-            activebackground="#218838",
-            activeforeground="white",
-            relief=tk.RAISED,
-            bd=2,
-            cursor="hand2",
-            command=self.start_listening
-        )
-        self.start_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        
-        self.stop_btn = tk.Button(
-            row1,
-            text="⏹ Stop Listening",
-            font=("Segoe UI", 11, "bold"),
-            bg="#dc3545",
-            fg="white",
-            activebackground="#c82333",
-            activeforeground="white",
-            relief=tk.RAISED,
-            bd=2,
-            cursor="hand2",
-            state=tk.DISABLED,
-            command=self.stop_listening
-        )
-        self.stop_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        
-        # Row 2: Mode Buttons
-        row2 = tk.Frame(button_frame, bg="white")
-        row2.pack(fill=tk.X, pady=5)
-        
-        self.normal_mode_btn = tk.Button(
-            row2,
-            text="🟢 Normal Mode",
-            font=("Segoe UI", 10, "bold"),
-            bg="#17a2b8",
-            fg="white",
-            activebackground="#138496",
-            activeforeground="white",
-            relief=tk.RAISED,
-            bd=2,
-            cursor="hand2",
-            command=self.set_normal_mode
-        )
-        self.normal_mode_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        
-        self.critical_mode_btn = tk.Button(
-            row2,
-            text="🔴 Critical Mode",
-            font=("Segoe UI", 10, "bold"),
-            bg="#ffc107",
-            fg="#212529",
-            activebackground="#e0a800",
-            activeforeground="#212529",
-            relief=tk.RAISED,
-            bd=2,
-            cursor="hand2",
-            command=self.set_critical_mode
-        )
-        self.critical_mode_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        
-        self.reset_btn = tk.Button(
-            row2,
-            text="🔄 Reset",
-            font=("Segoe UI", 10, "bold"),
-            bg="#6c757d",
-            fg="white",
-            activebackground="#5a6268",
-            activeforeground="white",
-            relief=tk.RAISED,
-            bd=2,
-            cursor="hand2",
-            command=self.reset_system
-        )
-        self.reset_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        # Row 1: Start/Stop Listening, Row 2: Mode Buttons
+        rows = {}
+        for row in (1, 2):
+            rows[row] = tk.Frame(button_frame, bg="white")
+            rows[row].pack(fill=tk.X, pady=5)
+            
+        for spec in _BUTTONS:
+            button = _make_button(rows[spec["row"]], spec, getattr(self, spec["cmd"]))
+            button.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+            setattr(self, spec["key"], button)
         
         # ===== LOG BOX =====
         log_frame = tk.Frame(self.root, bg="white", padx=20, pady=10)
@@ -303,7 +399,7 @@ class VoiceControllerApp:
         tk.Label(
             log_frame,
             text="Activity Log:",
-            font=("Segoe UI", 10, "bold"),
+            font=FONT_BOLD,
             bg="white",
             fg="#34495e"
         ).pack(anchor=tk.W)
@@ -321,6 +417,11 @@ class VoiceControllerApp:
         )
         self.log_box.pack(fill=tk.BOTH, expand=True, pady=5)
         
+        # Configure tags for colors
+        self.log_box.tag_config("timestamp", foreground="#7f848e")
+        for level, color in self._LEVEL_COLORS.items():
+            self.log_box.tag_config(level, foreground=color, font=("Consolas", 9, "bold"))
+        
         # ===== FOOTER =====
         footer_frame = tk.Frame(self.root, bg="#34495e", height=30)
         footer_frame.pack(fill=tk.X, side=tk.BOTTOM)
@@ -341,7 +442,7 @@ class VoiceControllerApp:
     def get_mic_list(self):
         """Get list of available microphone devices"""
         try:
-            mic_names = sr.Microphone.list_microphone_names()
+            mic_names = _cached_mic_names()
             if not mic_names:
                 self.log_message("WARN", "No microphones detected")
                 return ["No microphones found"]
@@ -364,6 +465,11 @@ class VoiceControllerApp:
         else:
             self.log_message("WARN", "No valid microphones available")
     
+    def on_refresh_mic(self):
+        """Handle Refresh click - re-enumerate devices"""
+        _cached_mic_names.cache_clear()
+        self.refresh_mic_list()
+    
     def get_selected_mic_index(self):
         """Get the device index for the selected microphone"""
         try:
@@ -413,12 +519,15 @@ class VoiceControllerApp:
         self.update_mic_status("Listening", "#28a745")
         self.log_message("INFO", "Started listening for voice commands")
         
-        # Run speech recognition in separate thread
-        threading.Thread(target=self.listen_loop, daemon=True).start()
+        # Calibrate and start the background listener off the UI thread
+        threading.Thread(target=self.start_background_listener, daemon=True).start()
         
     def stop_listening(self):
         """Stop speech recognition"""
         self.is_listening = False
+        if self._stop_bg:
+            self._stop_bg(wait_for_stop=False)
+            self._stop_bg = None
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.mic_combo.config(state="readonly")
@@ -426,71 +535,101 @@ class VoiceControllerApp:
         self.update_mic_status("Idle", "#6c757d")
         self.log_message("INFO", "Stopped listening")
         
-    def listen_loop(self):
-        """Continuous listening loop (runs in background thread)"""
-        with self.microphone as source:
-            self.log_message("INFO", "Calibrating for ambient noise...")
-            self.recognizer.adjust_for_ambient_noise(source, duration=0.3)
+    def start_background_listener(self):
+        """Calibrate, then hand the microphone to the background listener (runs in background thread)"""
+        try:
+            with self.microphone as source:
+                self.log_message("INFO", "Calibrating for ambient noise...")
+                self.recognizer.adjust_for_ambient_noise(source, duration=0.3)
+            self.log_message("INFO", f"Energy threshold set to {self.recognizer.energy_threshold:.0f}")
+        except Exception as e:
+            self.log_message("ERROR", f"Listening error: {e}")
+            return
             
-        while self.is_listening:
-            try:
-                with self.microphone as source:
-                    audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=5)
-                    
-                try:
-                    # Convert speech to text
-                    text = self.recognizer.recognize_google(audio).lower()
-                    self.root.after(0, self.process_speech, text)
-                    
-                except sr.UnknownValueError:
-                    self.root.after(0, self.log_message, "WARN", "Could not understand audio")
-                except sr.RequestError as e:
-                    self.root.after(0, self.log_message, "ERROR", f"Speech recognition error: {e}")
-                    
-            except sr.WaitTimeoutError:
-                continue
-            except Exception as e:
-                self.root.after(0, self.log_message, "ERROR", f"Listening error: {e}")
-                break
-                
-    def process_speech(self, text):
-        """Process recognized speech text"""
-        # Update UI with detected speech
-        self.speech_text_label.config(text=f'"{text}"')
-        self.log_message("HEARD", text)
+        self.load_local_recognizer()
+        
+        if not self.is_listening:
+            return
+            
+        # SpeechRecognition keeps one stream open and captures in its own thread
+        self._stop_bg = self.recognizer.listen_in_background(
+            self.microphone, self.on_audio, phrase_time_limit=PHRASE_LIMIT
+        )
+        
+        # Stop was pressed while the listener was starting
+        if not self.is_listening:
+            self._stop_bg(wait_for_stop=False)
+            
+    def load_local_recognizer(self):
+        """Load the Vosk model once if local recognition is configured"""
+        if self._vosk is not None or not VOSK_MODEL_PATH:
+            return
+        if KaldiRecognizer is None:
+            self.log_message("WARN", "vosk not installed - using Google recognition")
+            return
+        try:
+            model = Model(VOSK_MODEL_PATH)
+            self._vosk = KaldiRecognizer(model, VOSK_SAMPLE_RATE, json.dumps(VOSK_GRAMMAR))
+            self.log_message("INFO", "Using local Vosk recognizer")
+        except Exception as e:
+            self.log_message("ERROR", f"Failed to load Vosk model: {e}")
+            
+    def on_audio(self, recognizer, audio):
+        """Background listener callback - queue the phrase for recognition"""
+        if not self.is_listening:
+            return
+        # Recognize on the worker so capture resumes during the Google round-trip
+        self._recognize_pool.submit(self.recognize_audio, audio)
         
-        # Parse command
-        command_code = self.parse_command(text)
+    def recognize_audio(self, audio):
+        """Convert captured audio to text (runs on recognition worker)"""
+        try:
+            if self._vosk is not None:
+                text = self.recognize_local(audio)
+            else:
+                text = self.recognizer.recognize_google(audio).lower().strip()
+        except sr.UnknownValueError:
+            self.log_message("WARN", "Could not understand audio")
+            return
+        except sr.RequestError as e:
+            self.log_message("ERROR", f"Speech recognition error: {e}")
+            return
+        except Exception as e:
+            self.log_message("ERROR", f"Listening error: {e}")
+            return
+            
+        # Parse here so the Tk thread only applies the result; text is
+        # already normalized, which also keeps the parse cache keys uniform
+        self.log_message("HEARD", text)
+        command_code = _parse_command(text)
         
         if command_code:
             self.log_message("PARSED", f"Command mapped to code: {command_code}")
-            self.send_command(command_code)
         else:
             self.log_message("WARN", "Unknown command - no action taken")
             
+        self.root.after(0, self._apply_command, text, command_code)
+        
+    def recognize_local(self, audio):
+        """Decode audio with the grammar-restricted Vosk recognizer"""
+        self._vosk.AcceptWaveform(
+            audio.get_raw_data(convert_rate=VOSK_SAMPLE_RATE, convert_width=2)
+        )
+        text = json.loads(self._vosk.FinalResult()).get("text", "")
+        text = text.replace("[unk]", "").strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+        
+    def _apply_command(self, text, command_code):
+        """Show recognized speech and dispatch its command (runs on Tk thread)"""
+        self.speech_text_label.config(text=f'"{text}"')
+        if command_code:
+            self.send_command(command_code)
+            
     def parse_command(self, text):
         """Map speech text to command code"""
-        text = text.lower().strip()
-        
-        # Check for blood flow control commands
-        # Increase blood flow → LED ON (1)
-        if "increase blood flow" in text or \
-           ("increase" in text and "flow" in text) or \
-           "more blood" in text:
-            return "1"
-        
-        # Decrease blood flow → LED OFF (2)
-        if "decrease blood flow" in text or \
-           ("decrease" in text and "flow" in text) or \
-           "reduce blood" in text:
-            return "2"
-        
-        # Check for exact matches in command map
-        for phrase, code in COMMAND_MAP.items():
-            if phrase in text:
-                return code
-                
-        return None
+        return _parse_command(text.lower().strip())
         
     # ============================================
     # ESP8266 COMMUNICATION
@@ -498,42 +637,69 @@ class VoiceControllerApp:
     
     def send_command(self, value):
         """Send HTTP GET request to ESP8266"""
-        url = f"http://{ESP_IP}/{value}"
+        # Drop rapid repeats the ESP would only have to serialize
+        now = time.monotonic()
+        last_value, last_time = self._last_cmd
+        if value == last_value and now - last_time < DEBOUNCE_WINDOW:
+            self.log_message("INFO", f"Command {value} debounced")
+            return
+        self._last_cmd = (value, now)
+        
+        path = _PATH_FOR[value]
         
         def send_request():
             try:
-                self.root.after(0, self.log_message, "SENT", f"Sending command {value} to ESP...")
-                response = requests.get(url, timeout=TIMEOUT)
+                self.log_message("SENT", f"Sending command {value} to ESP...")
+                status = self._esp_request("GET", path)
                 
-                if response.status_code == 200:
-                    self.root.after(0, self.log_message, "OK", "ESP acknowledged command")
+                if status == 200:
+                    self.log_message("OK", "ESP acknowledged command")
                     self.root.after(0, self.update_esp_status, "Connected", "#28a745")
                 else:
-                    self.root.after(0, self.log_message, "WARN", f"ESP returned status {response.status_code}")
+                    self.log_message("WARN", f"ESP returned status {status}")
                     
-            except requests.exceptions.ConnectionError:
-                self.root.after(0, self.log_message, "ERROR", "Cannot connect to ESP - check IP and WiFi")
-                self.root.after(0, self.update_esp_status, "Not Connected", "#dc3545")
-            except requests.exceptions.Timeout:
-                self.root.after(0, self.log_message, "ERROR", "ESP request timeout")
+            except socket.timeout:
+                self.log_message("ERROR", "ESP request timeout")
                 self.root.after(0, self.update_esp_status, "Timeout", "#ffc107")
+            except OSError:
+                self.log_message("ERROR", "Cannot connect to ESP - check IP and WiFi")
+                self.root.after(0, self.update_esp_status, "Not Connected", "#dc3545")
             except Exception as e:
-                self.root.after(0, self.log_message, "ERROR", f"Request failed: {e}")
+                self.log_message("ERROR", f"Request failed: {e}")
                 
-        # Run in background thread
-        threading.Thread(target=send_request, daemon=True).start()
+        # Run on the HTTP worker
+        self._http_pool.submit(send_request)
         
     def check_esp_connection(self):
         """Check if ESP8266 is reachable"""
         def check():
             try:
-                response = requests.get(f"http://{ESP_IP}/", timeout=2)
+                # HEAD: only reachability matters, skip the response body
+                self._esp_request("HEAD", "/")
                 self.root.after(0, self.update_esp_status, "Connected", "#28a745")
             except:
                 self.root.after(0, self.update_esp_status, "Not Connected", "#dc3545")
                 
-        threading.Thread(target=check, daemon=True).start()
+        self._http_pool.submit(check)
         
+    def _esp_request(self, method, path):
+        """Send one request over the reused ESP connection, return the status code"""
+        with self._conn_lock:
+            for attempt in (1, 2):
+                try:
+                    self._conn.request(method, path)
+                    response = self._conn.getresponse()
+                    response.read()
+                    return response.status
+                except (BrokenPipeError, ConnectionResetError):
+                    # ESP dropped the idle keep-alive connection; reconnect once
+                    self._conn.close()
+                    if attempt == 2:
+                        raise
+                except Exception:
+                    self._conn.close()
+                    raise
+                    
     # ============================================
     # MODE CONTROL
     # ============================================
@@ -556,6 +722,16 @@ class VoiceControllerApp:
         self.log_message("RESET", "System reset command sent")
         self.speech_text_label.config(text="(waiting for input...)")
         
+    def on_close(self):
+        """Stop background work and close the window"""
+        self.is_listening = False
+        if self._stop_bg:
+            self._stop_bg(wait_for_stop=False)
+        self._recognize_pool.shutdown(wait=False, cancel_futures=True)
+        self._http_pool.shutdown(wait=False, cancel_futures=True)
+        self._conn.close()
+        self.root.destroy()
+        
     # ============================================
     # UI UPDATE METHODS
     # ============================================
@@ -569,35 +745,35 @@ class VoiceControllerApp:
         self.esp_status_label.config(text=status, fg=color)
         
     def log_message(self, level, message):
-        """Add message to log box"""
+        """Queue message for the log box (safe to call from any thread)"""
         timestamp = datetime.now().strftime("%H:%M:%S")
+        self._log_q.put((timestamp, level, message))
         
-        # Color coding for different log levels
-        colors = {
-            "INFO": "#61afef",
-            "HEARD": "#98c379",
-            "PARSED": "#e5c07b",
-            "SENT": "#c678dd",
-            "OK": "#56b6c2",
-            "WARN": "#e06c75",
-            "ERROR": "#e06c75",
-            "MODE": "#d19a66",
-            "RESET": "#abb2bf"
-        }
-        
-        color = colors.get(level, "#d4d4d4")
-        
-        self.log_box.config(state=tk.NORMAL)
-        self.log_box.insert(tk.END, f"[{timestamp}] ", "timestamp")
-        self.log_box.insert(tk.END, f"[{level}] ", level)
-        self.log_box.insert(tk.END, f"{message}\n")
-        
-        # Configure tags for colors
-        self.log_box.tag_config("timestamp", foreground="#7f848e")
-        self.log_box.tag_config(level, foreground=color, font=("Consolas", 9, "bold"))
-        
-        self.log_box.see(tk.END)
-        self.log_box.config(state=tk.DISABLED)
+    def _drain_log(self):
+        """Write all queued log messages in one batch, then reschedule"""
+        entries = []
+        try:
+            while True:
+                entries.append(self._log_q.get_nowait())
+        except queue.Empty:
+            pass
+            
+        if entries:
+            self.log_box.config(state=tk.NORMAL)
+            for timestamp, level, message in entries:
+                self.log_box.insert(tk.END, f"[{timestamp}] ", "timestamp")
+                self.log_box.insert(tk.END, f"[{level}] ", level)
+                self.log_box.insert(tk.END, f"{message}\n")
+                
+            # Keep a rolling window so memory and re-layout cost stay bounded
+            line_count = int(self.log_box.index("end-1c").split(".")[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_box.delete("1.0", f"{LOG_TRIM_LINES + 1}.0")
+                
+            self.log_box.see(tk.END)
+            self.log_box.config(state=tk.DISABLED)
+            
+        self.root.after(LOG_FLUSH_MS, self._drain_log)
 
 
 # ============================================